@@ -1,4 +1,5 @@
 import os
+import sys
 import zipfile
 import requests
 import random
@@ -6,6 +7,12 @@ from shutil import move
 from pycocotools.coco import COCO
 import json
 
+# manifest helpers are shared with the training code (src/rd)
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "rd")
+)
+from manifest import update_manifest
+
 # Define categories that represent natural elements
 NATURAL_CATEGORIES = ["person", "car", "sky", "animal", "bird", "dog", "cat", "plant"]
 
@@ -89,6 +96,16 @@ def extract_zip(zip_path, outputfolder):
     return outputfolder
 
 
+def get_categories_by_file(coco):
+    # image file name -> category names found in its annotations
+    categories = {}
+    names = {cat["id"]: cat["name"] for cat in coco.loadCats(coco.getCatIds())}
+    for ann in coco.dataset["annotations"]:
+        file_name = coco.imgs[ann["image_id"]]["file_name"]
+        categories.setdefault(file_name, set()).add(names[ann["category_id"]])
+    return categories
+
+
 def get_nb_file(folder):
     images = [
         os.path.join(root, f)
@@ -123,6 +140,14 @@ train_folder, val_folder = split_train_vald(
 )
 
 print("Data split completed.")
+
+# Write each split manifest (paths, sizes, dimensions, hashes, categories) :
+# datasets read it instead of walking the folders, only new files are hashed
+train_categories = get_categories_by_file(coco)
+update_manifest(TRAIN_DIR, categories=train_categories)
+update_manifest(VAL_DIR, categories=train_categories)
+test_coco = COCO(os.path.join(ANNOTATIONS_DIR, "annotations/instances_val2017.json"))
+update_manifest(TEST_DIR, categories=get_categories_by_file(test_coco))
 print(
     f"Training images: {get_nb_file(train_folder)}, Validation images: {get_nb_file(val_folder)} , Test images: {get_nb_file(test_folder)}"
 )
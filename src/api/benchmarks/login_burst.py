@@ -0,0 +1,158 @@
+# Project PicoPix
+# Authors : Mohamed CHELALI, Daniel LEWANDOWSKI, Yannick OREAL
+# Load test : colorize latency during a login burst
+#
+# Usage (from src/api, with the api running) :
+#   python -m benchmarks.login_burst --url http://localhost:8000 --logins 400 --concurrency 64
+#
+# The colorize latency measured during the burst should stay close to the
+# baseline : bcrypt runs in the bounded password pool (AUTH_HASH_WORKERS) and
+# logins above AUTH_HASH_MAX_PENDING are rejected with a 503.
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+BW_IMAGE = "tests/data/test_main_valid_bw_image.jpg"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def summary(values):
+    return (
+        f"n={len(values):4d} p50={percentile(values, 50) * 1000:8.1f}ms "
+        f"p95={percentile(values, 95) * 1000:8.1f}ms "
+        f"mean={statistics.mean(values) * 1000:8.1f}ms"
+    )
+
+
+async def prepare_user(client, username, password):
+    await client.post(
+        "/auth/create_user",
+        json={
+            "username": username,
+            "firstname": "Load",
+            "lastname": "TEST",
+            "password": password,
+        },
+    )
+    response = await client.post(
+        "/auth/token", data={"username": username, "password": password}
+    )
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    with open(BW_IMAGE, "rb") as f:
+        response = await client.post(
+            "/upload_bw_image",
+            headers=headers,
+            files={"file": ("bw.jpg", f, "image/jpeg")},
+        )
+    response.raise_for_status()
+    return headers
+
+
+async def probe(client, headers, path, interval, count=None, until=None):
+    # sequential requests on the probed endpoint, returns latencies
+    latencies = []
+    while (count is not None and len(latencies) < count) or (
+        until is not None and not until.is_set()
+    ):
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        # colorized images names have a 1 second resolution
+        await asyncio.sleep(max(0.0, interval - latencies[-1]))
+    return latencies
+
+
+async def login_burst(client, username, password, logins, concurrency, done):
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = Counter()
+
+    async def login():
+        async with semaphore:
+            response = await client.post(
+                "/auth/token", data={"username": username, "password": password}
+            )
+            statuses[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    done.set()
+    return statuses, time.perf_counter() - start
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 8)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=120, limits=limits
+    ) as client:
+        headers = await prepare_user(client, args.username, args.password)
+        # warm up (model, caches)
+        await probe(client, headers, args.probe, args.interval, count=2)
+        baseline = await probe(
+            client, headers, args.probe, args.interval, count=args.probes
+        )
+
+        done = asyncio.Event()
+        (statuses, elapsed), during = await asyncio.gather(
+            login_burst(
+                client,
+                args.username,
+                args.password,
+                args.logins,
+                args.concurrency,
+                done,
+            ),
+            probe(client, headers, args.probe, args.interval, until=done),
+        )
+        await client.post(f"/delete_user?username={args.username}", headers=headers)
+
+    print(f"{args.probe} baseline     : {summary(baseline)}")
+    print(f"{args.probe} during burst : {summary(during)}")
+    print(
+        f"logins : {args.logins} in {elapsed:.1f}s "
+        f"({args.logins / elapsed:.1f}/s), status codes {dict(statuses)}"
+    )
+    ratio = percentile(during, 95) / percentile(baseline, 95)
+    print(f"p95 ratio burst/baseline : {ratio:.2f}")
+    return 0 if args.max_ratio is None or ratio <= args.max_ratio else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default="http://localhost:8000")
+    parser.add_argument("--username", type=str, default="loadtestuser")
+    parser.add_argument("--password", type=str, default="loadtestpassword")
+    parser.add_argument("--logins", type=int, default=400, help="logins in burst")
+    parser.add_argument(
+        "--concurrency", type=int, default=64, help="concurrent login requests"
+    )
+    parser.add_argument(
+        "--probe", type=str, default="/colorize_bw_image", help="probed endpoint"
+    )
+    parser.add_argument(
+        "--probes", type=int, default=10, help="baseline probe requests"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.05,
+        help="min seconds between two probe requests",
+    )
+    parser.add_argument(
+        "--max-ratio",
+        type=float,
+        default=None,
+        help="exit with error if p95 during burst > max-ratio * baseline p95",
+    )
+    sys.exit(asyncio.run(main(parser.parse_args())))
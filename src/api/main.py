@@ -7,7 +7,8 @@ from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, P
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select
 from typing import Annotated
 from starlette.background import BackgroundTasks
 import tempfile
@@ -20,12 +21,20 @@ import logging
 from contextlib import asynccontextmanager
 import botocore
 
-from pixlibs.database import engine
+from pixlibs.database import engine, get_session, get_pool_status
+from pixlibs.migrations import run_migrations
 import pixlibs.storage_boto3
 import pixlibs.auth
 from pixlibs.schemas_api import Imagerating, FavModel
-from passlib.context import CryptContext
 from pixlibs.auth import get_current_user
+from pixlibs.user_cache import user_cache
+from pixlibs.passwords import bcrypt_context, password_hasher
+from pixlibs.metrics import (
+    MetricsMiddleware,
+    metrics_response,
+    observe_stage,
+    stats_collector,
+)
 from pixlibs.storage_boto3 import get_storage, storageclient
 from pixlibs.inference import (
     infer_autoencoder,
@@ -73,6 +82,8 @@ async def lifespan(application: FastAPI):
     os.makedirs("cache/tmp", exist_ok=True)
     # create database structure
     pixlibs.models.Base.metadata.create_all(bind=engine)
+    # upgrade existing database structure
+    run_migrations(engine)
     create_default_user()
     update_db_models()
     yield
@@ -86,15 +97,12 @@ app = FastAPI(
     lifespan=lifespan,
 )
 app.mount("/static", StaticFiles(directory="static"), name="static")
+app.add_middleware(MetricsMiddleware)
 
-
-# PostgreSQL Database session function
-def get_db():
-    db = pixlibs.database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# components counters exported on /metrics
+stats_collector.register("user_cache", user_cache.stats)
+stats_collector.register("password_hasher", password_hasher.stats)
+stats_collector.register("db_pool", lambda: get_pool_status()["sync"])
 
 
 # Declare Endpoints
@@ -102,7 +110,9 @@ def get_db():
 app.include_router(pixlibs.auth.router)
 
 # endpoints dependency
-db_dependency = Annotated[Session, Depends(get_db)]  # database access is ok
+db_dependency = Annotated[
+    Session | AsyncSession, Depends(get_session)
+]  # database access is ok
 user_dependency = Annotated[
     dict, Depends(get_current_user)
 ]  # user authentication is ok
@@ -126,10 +136,8 @@ except botocore.exceptions.ClientError as e:
     else:
         print(f"Error accessing bucket '{bucket_name}': {e}")
 
-# DB default user creation function
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
+# DB default user creation function
 def create_default_user():
     db = pixlibs.database.SessionLocal()
     # result = db.query(pixlibs.models.Users).filter_by(pixlibs.models.Users.username == "default")
@@ -213,6 +221,22 @@ async def favicon():
     )
 
 
+# prometheus metrics endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Description
+    -----------
+    Endpoint : Prometheus metrics (requests, colorize stages, models load time,
+    queues depth, caches hit rates)
+
+    Returns
+    -------
+    text : Prometheus exposition format
+    """
+    return metrics_response()
+
+
 # get user informations
 @app.get("/get_user_informations")
 async def get_user_informations(user: user_dependency, db: db_dependency):
@@ -242,16 +266,12 @@ async def get_user_informations(user: user_dependency, db: db_dependency):
 
     # contruct dictionnary
     try:
-        userdata = (
-            db.query(pixlibs.models.Users)
-            .filter(pixlibs.models.Users.id == user["id"])
-            .first()
-        )
+        userdata = await user_cache.get(db, user["id"])
         user_informations = {
-            "firstname": userdata.firstname,
-            "lastname": userdata.lastname,
-            "favorite_model": userdata.pref_model,
-            "isadmin": userdata.isadmin,
+            "firstname": userdata["firstname"],
+            "lastname": userdata["lastname"],
+            "favorite_model": userdata["pref_model"],
+            "isadmin": userdata["isadmin"],
         }
     except Exception as e:
         logger.error(
@@ -296,13 +316,15 @@ async def set_favorite_model(
     if favorite_model is not None:
         if (int(favorite_model.mdl) >= 0) and (int(favorite_model.mdl) <= 2):
             try:
-                user = (
-                    db.query(pixlibs.models.Users)
-                    .filter(pixlibs.models.Users.id == user["id"])
-                    .first()
+                userdata = await pixlibs.database.fetch_first(
+                    db,
+                    select(pixlibs.models.Users).where(
+                        pixlibs.models.Users.id == user["id"]
+                    ),
                 )
-                user.pref_model = int(favorite_model.mdl)
-                db.commit()
+                userdata.pref_model = int(favorite_model.mdl)
+                await pixlibs.database.commit(db)
+                user_cache.invalidate(user["id"])
             except Exception as e:
                 logger.error(
                     format_logger(
@@ -332,6 +354,45 @@ async def set_favorite_model(
         )
 
 
+# diagnostics (admin only)
+@app.get("/diagnostics")
+async def diagnostics(user: user_dependency, db: db_dependency):
+    """
+    Description
+    -----------
+    endpoint to get api runtime diagnostics (database connexion pools usage,
+    users cache hit rate, password hashing pool)
+    Parameters
+    ----------
+    user: oauth2 token required
+    db: postgres connexion required
+    Returns
+    -------
+    string: diagnostics (json)
+    """
+
+    # Check authentication
+    if user is None:
+        logger.exception("Authentication Failed")
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    # log
+    logger.info(format_logger(user["id"], "", "Request /diagnostics!"))
+
+    # check if user is admin
+    operator_user = await user_cache.get(db, user["id"])
+    if not operator_user["isadmin"]:
+        logger.exception("You are not authorized to get diagnostics.")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="You are not authorized to get diagnostics.",
+        )
+    return {
+        "db_pool": get_pool_status(),
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+    }
+
+
 # get users list
 @app.get("/get_users_list")
 async def get_users_list(user: user_dependency, db: db_dependency):
@@ -356,12 +417,8 @@ async def get_users_list(user: user_dependency, db: db_dependency):
     logger.info(format_logger(user["id"], "", "Request /disable_user!"))
 
     # check if username = user authentified or if user is admin
-    operator_user = (
-        db.query(pixlibs.models.Users)
-        .filter(pixlibs.models.Users.id == user["id"])
-        .first()
-    )
-    if not operator_user.isadmin:
+    operator_user = await user_cache.get(db, user["id"])
+    if not operator_user["isadmin"]:
         logger.exception("You are not authorized to get users list.")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -369,7 +426,7 @@ async def get_users_list(user: user_dependency, db: db_dependency):
         )
     else:
         try:
-            users = db.query(pixlibs.models.Users).all()
+            users = await pixlibs.database.fetch_all(db, select(pixlibs.models.Users))
             users_list = dict()
             user_fields = dict()
             for usera in users:
@@ -426,12 +483,8 @@ async def disable_user(user: user_dependency, db: db_dependency, username: str):
             status_code=500, detail="Disable your own account is prohibited."
         )
     else:
-        operator_user = (
-            db.query(pixlibs.models.Users)
-            .filter(pixlibs.models.Users.id == user["id"])
-            .first()
-        )
-        if not operator_user.isadmin:
+        operator_user = await user_cache.get(db, user["id"])
+        if not operator_user["isadmin"]:
             logger.exception("You are not authorized to disable user.")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -439,14 +492,16 @@ async def disable_user(user: user_dependency, db: db_dependency, username: str):
             )
         else:
             try:
-                usertodisable = (
-                    db.query(pixlibs.models.Users)
-                    .filter(pixlibs.models.Users.username == username)
-                    .first()
+                usertodisable = await pixlibs.database.fetch_first(
+                    db,
+                    select(pixlibs.models.Users).where(
+                        pixlibs.models.Users.username == username
+                    ),
                 )
                 if usertodisable is not None:
                     usertodisable.disabled = True
-                    db.commit()
+                    await pixlibs.database.commit(db)
+                    user_cache.invalidate(usertodisable.id)
                 else:
                     logger.error(
                         format_logger(
@@ -509,12 +564,8 @@ async def disable_user(user: user_dependency, db: db_dependency, username: str):
             status_code=500, detail="Enable your own account is prohibited."
         )
     else:
-        operator_user = (
-            db.query(pixlibs.models.Users)
-            .filter(pixlibs.models.Users.id == user["id"])
-            .first()
-        )
-        if not operator_user.isadmin:
+        operator_user = await user_cache.get(db, user["id"])
+        if not operator_user["isadmin"]:
             logger.exception("You are not authorized to enable user.")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -522,14 +573,16 @@ async def disable_user(user: user_dependency, db: db_dependency, username: str):
             )
         else:
             try:
-                usertoenable = (
-                    db.query(pixlibs.models.Users)
-                    .filter(pixlibs.models.Users.username == username)
-                    .first()
+                usertoenable = await pixlibs.database.fetch_first(
+                    db,
+                    select(pixlibs.models.Users).where(
+                        pixlibs.models.Users.username == username
+                    ),
                 )
                 if usertoenable is not None:
                     usertoenable.disabled = False
-                    db.commit()
+                    await pixlibs.database.commit(db)
+                    user_cache.invalidate(usertoenable.id)
                 else:
                     logger.error(
                         format_logger(
@@ -591,12 +644,8 @@ async def set_admin_access(user: user_dependency, db: db_dependency, username: s
             status_code=500, detail="Enable your own account is prohibited."
         )
     else:
-        operator_user = (
-            db.query(pixlibs.models.Users)
-            .filter(pixlibs.models.Users.id == user["id"])
-            .first()
-        )
-        if not operator_user.isadmin:
+        operator_user = await user_cache.get(db, user["id"])
+        if not operator_user["isadmin"]:
             logger.exception("You are not authorized to set/unset admin user.")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -604,14 +653,16 @@ async def set_admin_access(user: user_dependency, db: db_dependency, username: s
             )
         else:
             try:
-                usertochange = (
-                    db.query(pixlibs.models.Users)
-                    .filter(pixlibs.models.Users.username == username)
-                    .first()
+                usertochange = await pixlibs.database.fetch_first(
+                    db,
+                    select(pixlibs.models.Users).where(
+                        pixlibs.models.Users.username == username
+                    ),
                 )
                 if usertochange is not None:
                     usertochange.isadmin = not usertochange.isadmin
-                    db.commit()
+                    await pixlibs.database.commit(db)
+                    user_cache.invalidate(usertochange.id)
                 else:
                     logger.error(
                         format_logger(
@@ -768,7 +819,7 @@ async def upload_bw_image(
             user_id=user["id"],
         )
         db.add(create_bw_image_model)
-        db.commit()
+        await pixlibs.database.commit(db)
     except Exception as e:
         logger.error(
             format_logger(
@@ -871,15 +922,26 @@ async def colorize_bw_image(
         raise HTTPException(status_code=401, detail="Authentication Failed")
     # log
     logger.info(format_logger(user["id"], "", "Request /colorize_bw_image endpoint!"))
+    stage_start = time.perf_counter()
 
     # check last uploaded file (or none)
     try:
-        lastimageobj = (
-            db.query(pixlibs.models.BW_Images)
-            .filter(pixlibs.models.BW_Images.user_id == user["id"])
-            .order_by(pixlibs.models.BW_Images.filename.desc())
-            .first()
+        # covered by index ix_bw_images_user_id_upload_date
+        lastimageobj = await pixlibs.database.fetch_row(
+            db,
+            select(
+                pixlibs.models.BW_Images.id,
+                pixlibs.models.BW_Images.user_id,
+                pixlibs.models.BW_Images.filename,
+            )
+            .where(pixlibs.models.BW_Images.user_id == user["id"])
+            .order_by(
+                pixlibs.models.BW_Images.upload_date.desc(),
+                pixlibs.models.BW_Images.id.desc(),
+            )
+            .limit(1),
         )
+        stage_start = observe_stage("db_lookup", stage_start)
     except Exception as e:
         logger.error(
             format_logger(
@@ -895,6 +957,7 @@ async def colorize_bw_image(
         s3client.Bucket(
             AWS_BUCKET_MEDIA,
         ).download_file(lastimageobj.filename, f"cache{tempbwfilename.name}.jpg")
+        observe_stage("s3_download", stage_start)
     except Exception as e:
         logger.error(
             format_logger(
@@ -909,12 +972,7 @@ async def colorize_bw_image(
         )
 
     # get user favorite model
-    favmodeluser = (
-        db.query(pixlibs.models.Users)
-        .filter(pixlibs.models.Users.id == user["id"])
-        .first()
-        .pref_model
-    )
+    favmodeluser = (await user_cache.get(db, user["id"]))["pref_model"]
     if favmodeluser == 0:
         favmodeluser = 3
     # set value in binary string
@@ -923,9 +981,12 @@ async def colorize_bw_image(
     # image colorization
     print(models_list)
     try:
+        stage_start = time.perf_counter()
         grayscale_image = cv2.imread(
             f"cache{tempbwfilename.name}.jpg", cv2.IMREAD_GRAYSCALE
         )
+        observe_stage("decode", stage_start)
+        # preprocess / forward / postprocess are recorded by the models
         if favmodeluser[1:] == "1":
             rgb_image1 = infer_autoencoder(grayscale_image)
         if favmodeluser[:1] == "1":
@@ -949,10 +1010,12 @@ async def colorize_bw_image(
     if favmodeluser[:1] == "1":
         tempcolorfilename2 = tempfile.NamedTemporaryFile()
     try:
+        stage_start = time.perf_counter()
         if favmodeluser[1:] == "1":
             cv2.imwrite(f"cache{tempcolorfilename1.name}.jpg", rgb_image1)
         if favmodeluser[:1] == "1":
             cv2.imwrite(f"cache{tempcolorfilename2.name}.jpg", rgb_image2)
+        stage_start = observe_stage("encode", stage_start)
     except Exception as e:
         logger.error(
             format_logger(
@@ -987,6 +1050,7 @@ async def colorize_bw_image(
                 f"cache{tempcolorfilename2.name}.jpg",
                 f"color_images/{s3colorfilename2}",
             )
+        observe_stage("s3_upload", stage_start)
     except Exception as e:
         logger.error(
             format_logger(
@@ -1028,12 +1092,14 @@ async def colorize_bw_image(
 
     # add colororized image ref to database
     try:
+        stage_start = time.perf_counter()
         if favmodeluser[1:] == "1":
             # get model id
-            last_autoencoder_model = (
-                db.query(pixlibs.models.MODELS)
-                .filter(pixlibs.models.MODELS.filename == models_list[0])
-                .first()
+            last_autoencoder_model = await pixlibs.database.fetch_first(
+                db,
+                select(pixlibs.models.MODELS).where(
+                    pixlibs.models.MODELS.filename == models_list[0]
+                ),
             )
             # add image
             color_image_autoencoder = pixlibs.models.COLOR_Images(
@@ -1046,10 +1112,11 @@ async def colorize_bw_image(
 
         if favmodeluser[:1] == "1":
             # get model id
-            last_pix2pix_model = (
-                db.query(pixlibs.models.MODELS)
-                .filter(pixlibs.models.MODELS.filename == models_list[1])
-                .first()
+            last_pix2pix_model = await pixlibs.database.fetch_first(
+                db,
+                select(pixlibs.models.MODELS).where(
+                    pixlibs.models.MODELS.filename == models_list[1]
+                ),
             )
             # add image
             color_image_pix2pix = pixlibs.models.COLOR_Images(
@@ -1060,7 +1127,8 @@ async def colorize_bw_image(
             )
             db.add(color_image_pix2pix)
 
-        db.commit()
+        await pixlibs.database.commit(db)
+        observe_stage("db_commit", stage_start)
     except Exception as e:
         logger.error(
             format_logger(
@@ -1117,23 +1185,26 @@ async def get_colorized_images_list(
 
     # contruct dict of dictionnaries
     try:
-        color_images = (
-            db.query(pixlibs.models.COLOR_Images)
-            .filter(pixlibs.models.COLOR_Images.user_id == user["id"])
-            .all()
+        color_images = await pixlibs.database.fetch_all(
+            db,
+            select(pixlibs.models.COLOR_Images).where(
+                pixlibs.models.COLOR_Images.user_id == user["id"]
+            ),
         )
         images_list = dict()
         imageitem = dict()
         for image in color_images:
-            bw_image = (
-                db.query(pixlibs.models.BW_Images)
-                .filter(pixlibs.models.BW_Images.id == image.bwimage_id)
-                .first()
+            bw_image = await pixlibs.database.fetch_first(
+                db,
+                select(pixlibs.models.BW_Images).where(
+                    pixlibs.models.BW_Images.id == image.bwimage_id
+                ),
             )
-            imagemodel = (
-                db.query(pixlibs.models.MODELS)
-                .filter(pixlibs.models.MODELS.id == image.model_id)
-                .first()
+            imagemodel = await pixlibs.database.fetch_first(
+                db,
+                select(pixlibs.models.MODELS).where(
+                    pixlibs.models.MODELS.id == image.model_id
+                ),
             )
             print(f"{AWS_ENDPOINT_URL}/{AWS_BUCKET_MEDIA}/{bw_image.filename}")
             print(f"{AWS_ENDPOINT_URL}/{AWS_BUCKET_MEDIA}/{image.filename}")
@@ -1196,21 +1267,19 @@ async def rate_colorized_image(
 
     if (id is not None) and (rating is not None):
         if (int(rating) >= 0) and (int(rating) <= 5):
-            color_image = (
-                db.query(pixlibs.models.COLOR_Images)
-                .filter(
+            color_image = await pixlibs.database.fetch_first(
+                db,
+                select(pixlibs.models.COLOR_Images).where(
                     and_(
                         pixlibs.models.COLOR_Images.user_id == user["id"],
                         pixlibs.models.COLOR_Images.id == int(id),
                     )
-                )
-                .first()
-                or None
+                ),
             )
             if color_image is not None:
                 try:
                     color_image.rating = rating
-                    db.commit()
+                    await pixlibs.database.commit(db)
                 except Exception as e:
                     logger.error(
                         format_logger(
@@ -1286,11 +1355,19 @@ async def download_last_colorized_image(
 
     # check last created color image
     try:
-        lastimageobj = (
-            db.query(pixlibs.models.COLOR_Images)
-            .filter(pixlibs.models.COLOR_Images.user_id == user["id"])
-            .order_by(pixlibs.models.COLOR_Images.filename.desc())
-            .first()
+        # covered by index ix_color_images_user_id_creation_date
+        lastimageobj = await pixlibs.database.fetch_row(
+            db,
+            select(
+                pixlibs.models.COLOR_Images.id,
+                pixlibs.models.COLOR_Images.filename,
+            )
+            .where(pixlibs.models.COLOR_Images.user_id == user["id"])
+            .order_by(
+                pixlibs.models.COLOR_Images.creation_date.desc(),
+                pixlibs.models.COLOR_Images.id.desc(),
+            )
+            .limit(1),
         )
     except Exception as e:
         logger.error(
@@ -1382,15 +1459,14 @@ async def download_colorized_image(
 
     # check color image by id
     try:
-        imageobj = (
-            db.query(pixlibs.models.COLOR_Images)
-            .filter(
+        imageobj = await pixlibs.database.fetch_first(
+            db,
+            select(pixlibs.models.COLOR_Images).where(
                 and_(
                     pixlibs.models.COLOR_Images.user_id == user["id"],
                     pixlibs.models.COLOR_Images.id == id,
                 )
-            )
-            .first()
+            ),
         )
     except Exception as e:
         logger.error(
@@ -1479,12 +1555,8 @@ async def delete_user(
 
     # check if username = user authentified or if user is admin , get user id
     if user["username"] != username:
-        operator_user = (
-            db.query(pixlibs.models.Users)
-            .filter(pixlibs.models.Users.id == user["id"])
-            .first()
-        )
-        if not operator_user.isadmin:
+        operator_user = await user_cache.get(db, user["id"])
+        if not operator_user["isadmin"]:
             logger.exception("You are not authorized to delete user.")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1493,11 +1565,13 @@ async def delete_user(
         else:
             try:
                 userid = (
-                    db.query(pixlibs.models.Users)
-                    .filter(pixlibs.models.Users.username == username)
-                    .first()
-                    .id
-                )
+                    await pixlibs.database.fetch_first(
+                        db,
+                        select(pixlibs.models.Users).where(
+                            pixlibs.models.Users.username == username
+                        ),
+                    )
+                ).id
             except Exception as e:
                 logger.error(
                     format_logger(
@@ -1516,11 +1590,14 @@ async def delete_user(
 
     # delete users's bw images
     try:
-        bw_images = db.query(pixlibs.models.BW_Images).filter(
-            pixlibs.models.BW_Images.user_id == userid
+        bw_images = await pixlibs.database.fetch_all(
+            db,
+            select(pixlibs.models.BW_Images).where(
+                pixlibs.models.BW_Images.user_id == userid
+            ),
         )
-        if bw_images.count() > 0:
-            for image in bw_images.all():
+        if len(bw_images) > 0:
+            for image in bw_images:
                 try:
                     s3client.Object(AWS_BUCKET_MEDIA, image.filename).delete()
                 except Exception as e:
@@ -1537,13 +1614,8 @@ async def delete_user(
                         detail=f"File delete error : failed to delete {image.filename} on bucket.",
                     )
                 try:
-                    imagetodelete = (
-                        db.query(pixlibs.models.BW_Images)
-                        .filter(pixlibs.models.BW_Images.id == image.id)
-                        .first()
-                    )
-                    db.delete(imagetodelete)
-                    db.commit()
+                    await pixlibs.database.delete(db, image)
+                    await pixlibs.database.commit(db)
                 except Exception as e:
                     logger.error(
                         format_logger(
@@ -1571,11 +1643,14 @@ async def delete_user(
 
     # delete users's color images
     try:
-        color_images = db.query(pixlibs.models.COLOR_Images).filter(
-            pixlibs.models.COLOR_Images.user_id == userid
+        color_images = await pixlibs.database.fetch_all(
+            db,
+            select(pixlibs.models.COLOR_Images).where(
+                pixlibs.models.COLOR_Images.user_id == userid
+            ),
         )
-        if color_images.count() > 0:
-            for image in color_images.all():
+        if len(color_images) > 0:
+            for image in color_images:
                 try:
                     s3client.Object(AWS_BUCKET_MEDIA, image.filename).delete()
                 except Exception as e:
@@ -1592,13 +1667,8 @@ async def delete_user(
                         detail=f"File delete error : failed to delete {image.filename} on bucket.",
                     )
                 try:
-                    imagetodelete = (
-                        db.query(pixlibs.models.COLOR_Images)
-                        .filter(pixlibs.models.COLOR_Images.id == image.id)
-                        .first()
-                    )
-                    db.delete(imagetodelete)
-                    db.commit()
+                    await pixlibs.database.delete(db, image)
+                    await pixlibs.database.commit(db)
                 except Exception as e:
                     logger.error(
                         format_logger(
@@ -1626,14 +1696,13 @@ async def delete_user(
 
     # delete user
     try:
-        usertodelete = (
-            db.query(pixlibs.models.Users)
-            .filter(pixlibs.models.Users.id == userid)
-            .first()
+        usertodelete = await pixlibs.database.fetch_first(
+            db, select(pixlibs.models.Users).where(pixlibs.models.Users.id == userid)
         )
         if usertodelete is not None:
-            db.delete(usertodelete)
-            db.commit()
+            await pixlibs.database.delete(db, usertodelete)
+            await pixlibs.database.commit(db)
+            user_cache.invalidate(userid)
         else:
             logger.error(
                 format_logger(
@@ -6,20 +6,18 @@ from datetime import timedelta, datetime
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 import jwt
 from jwt.exceptions import InvalidTokenError
 import os
 from dotenv import load_dotenv
-import logging
 from pixlibs import database
 from pixlibs import models
-
-# Ignore passlib warning
-logging.getLogger("passlib").setLevel(logging.ERROR)
+from pixlibs.passwords import password_hasher
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -29,8 +27,6 @@ AUTH_SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
 AUTH_ALGORITHM = os.getenv("AUTH_ALGORITHM")
 AUTH_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("AUTH_ACCESS_TOKEN_EXPIRE_MINUTES"))
 
-# Set Crypt Context
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
@@ -48,17 +44,8 @@ class Token(BaseModel):
     token_type: str
 
 
-# PostgreSQL Database session function
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # opened database condition
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[Session | AsyncSession, Depends(database.get_session)]
 
 
 # token attribution function (call authenticate function)
@@ -66,7 +53,7 @@ db_dependency = Annotated[Session, Depends(get_db)]
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: db_dependency
 ):
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     # if bad username or bad password
     if not user:
         raise HTTPException(
@@ -81,16 +68,37 @@ async def login_for_access_token(
 
 
 # authentication function
-def authenticate_user(username: str, password: str, db):
+async def authenticate_user(username: str, password: str, db):
     # check if user is in database
-    user = db.query(models.Users).filter(models.Users.username == username).first()
+    # the connexion goes back to the pool before bcrypt runs
+    user = await database.fetch_row_and_release(
+        db,
+        select(
+            models.Users.id,
+            models.Users.username,
+            models.Users.hashed_password,
+            models.Users.disabled,
+        ).where(models.Users.username == username),
+    )
     if not user:
         return False
     if user.disabled == True:
         return False
     # check of user's password (hashed) is same as in database
-    if not bcrypt_context.verify(password, user.hashed_password):
+    valid, new_hash = await password_hasher.verify_and_update(
+        password, user.hashed_password
+    )
+    if not valid:
         return False
+    # bcrypt cost factor changed since this hash was computed
+    if new_hash is not None:
+        await database.execute(
+            db,
+            update(models.Users)
+            .where(models.Users.id == user.id)
+            .values(hashed_password=new_hash),
+        )
+        await database.commit(db)
     # if user exists and his password is ok, then return user
     return user
 
@@ -129,13 +137,14 @@ async def create_user(db: db_dependency, create_user_request: CreateUserRequest)
         username=create_user_request.username,
         firstname=create_user_request.firstname,
         lastname=create_user_request.lastname,
-        hashed_password=bcrypt_context.hash(create_user_request.password),
+        hashed_password=await password_hasher.hash(create_user_request.password),
     )
     # SQL ADD request
     try:
         db.add(create_user_model)
-        db.commit()
+        await database.commit(db)
     except:
+        await database.rollback(db)
         raise HTTPException(status_code=500, detail="Could not create user.")
     return {"message": f"User {create_user_request.username} created !"}
 
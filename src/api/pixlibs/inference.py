@@ -1,4 +1,5 @@
 import io
+import time
 import cv2
 import numpy as np
 import requests
@@ -12,6 +13,7 @@ from model.colorizator import Net
 from model.pix2pix import GeneratorUNet
 
 from pixlibs.storage_boto3 import get_storage_client
+from pixlibs.metrics import MODEL_LOAD_DURATION, observe_stage
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
@@ -147,6 +149,8 @@ def infer_autoencoder(image: np.ndarray) -> np.ndarray:
     if image is None:
         raise ValueError("Input image is None. Please check the input.")
 
+    stage_start = time.perf_counter()
+
     # Resize and prepare the input image
     original_h, original_w = image.shape[:2]
     input_gray = cv2.resize(image, (256, 256))  # Resize to 256x256
@@ -159,10 +163,13 @@ def infer_autoencoder(image: np.ndarray) -> np.ndarray:
     input_gray = (
         torch.from_numpy(input_gray).unsqueeze(0).unsqueeze(0).float().to(device)
     )  # Shape: (1, 1, 256, 256)
+    stage_start = observe_stage("preprocess", stage_start, "autoencoder")
 
     # Perform inference
     with torch.no_grad():  # Disable gradient calculation
         output_ab = models_names["autoencoder"](input_gray)  # Shape: (1, 2, 256, 256)
+    # on cuda the kernels may still run, the wait is counted in postprocess
+    stage_start = observe_stage("forward", stage_start, "autoencoder")
 
     # Convert to RGB and resize to original dimensions
     colored_image = to_rgb(input_gray[0].cpu(), output_ab[0].cpu())
@@ -172,6 +179,7 @@ def infer_autoencoder(image: np.ndarray) -> np.ndarray:
     colored_image = (colored_image * 255).astype(
         np.uint8
     )  # Scale to [0, 255] for visualization
+    observe_stage("postprocess", stage_start, "autoencoder")
 
     return colored_image
 
@@ -180,6 +188,8 @@ def infer_pix2pix(image: np.ndarray) -> np.ndarray:
     """
     Infers a colorized version of an image using a pre-trained Pix2Pix model.
     """
+    stage_start = time.perf_counter()
+
     # Validate input normalization
     if not (0 <= image.min() and image.max() <= 1):
         print("Input image values should be normalized to the range [0, 1].")
@@ -211,10 +221,12 @@ def infer_pix2pix(image: np.ndarray) -> np.ndarray:
     input_tensor = (
         preprocess((image * 255).astype(np.uint8)).unsqueeze(0).to(device)
     )  # Add batch dimension
+    stage_start = observe_stage("preprocess", stage_start, "pix2pix")
 
     # Perform inference
     with torch.no_grad():
         output_tensor = models_names["pix2pix"](input_tensor)  # Output tensor, shape: (1, 3, 256, 256)
+    stage_start = observe_stage("forward", stage_start, "pix2pix")
 
     # Post-process the output
     output_image = (
@@ -227,6 +239,7 @@ def infer_pix2pix(image: np.ndarray) -> np.ndarray:
     output_image = (output_image * 255).astype(
         np.uint8
     )  # Scale to [0, 255] for visualization
+    observe_stage("postprocess", stage_start, "pix2pix")
 
     return output_image
 
@@ -242,6 +255,7 @@ if check_bucket_exists(s3_client, bucket_name) and check_bucket_not_empty(s3_cli
             continue
 
         models_list.append(lastest_model)
+        load_start = time.perf_counter()
 
         # Générer un lien présigné
         presigned_url = get_presigned_url(s3_client, bucket_name, lastest_model)
@@ -259,6 +273,7 @@ if check_bucket_exists(s3_client, bucket_name) and check_bucket_not_empty(s3_cli
             model.load_state_dict(state_dict)
             model.to(device)
             model.eval()
+            MODEL_LOAD_DURATION.labels(model_name).set(time.perf_counter() - load_start)
             print(
                 f"Le modèle {model_name} a été chargé avec succès depuis {presigned_url}."
             )
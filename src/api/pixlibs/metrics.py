@@ -0,0 +1,163 @@
+# Project PicoPix
+# Authors : Mohamed CHELALI, Daniel LEWANDOWSKI, Yannick OREAL
+# Prometheus metrics (requests, colorize stages, models, queues, caches)
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.responses import Response
+import time
+
+# requests (labelled by route template, not by raw path : bounded cardinality)
+HTTP_REQUESTS = Counter(
+    "picopix_http_requests_total",
+    "HTTP requests processed",
+    ["method", "endpoint", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "picopix_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "endpoint"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "picopix_http_requests_in_progress",
+    "HTTP requests being processed",
+)
+
+# colorize pipeline
+COLORIZE_STAGE_DURATION = Histogram(
+    "picopix_colorize_stage_duration_seconds",
+    "Duration of each /colorize_bw_image stage",
+    ["stage", "model"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# models
+MODEL_LOAD_DURATION = Gauge(
+    "picopix_model_load_duration_seconds",
+    "Time spent loading the model weights at startup",
+    ["model"],
+)
+
+
+def observe_stage(stage: str, start: float, model: str = "") -> float:
+    """
+    Description
+    -----------
+    record the time elapsed since start in the colorize stages histogram
+
+    Parameters
+    ----------
+    stage: stage name (preprocess, forward, postprocess, ...)
+    start: time.perf_counter() value at the beginning of the stage
+    model: model name for model dependant stages
+
+    Returns
+    -------
+    float: time.perf_counter() value, start of the next stage
+    """
+    now = time.perf_counter()
+    COLORIZE_STAGE_DURATION.labels(stage, model).observe(now - start)
+    return now
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests and their latency per endpoint.
+
+    Plain ASGI (no BaseHTTPMiddleware) : a few counters updates per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            # route is set by the router once matched
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_DURATION.labels(scope["method"], endpoint).observe(
+                time.perf_counter() - start
+            )
+            HTTP_REQUESTS.labels(scope["method"], endpoint, str(status_code)).inc()
+
+
+class StatsCollector:
+    """
+    Exports counters kept by other components (caches, pools, queues),
+    read only when /metrics is scraped : nothing added on the request path.
+    """
+
+    def __init__(self):
+        # name -> function returning a stats dict
+        self.sources = {}
+
+    def register(self, name: str, stats_function):
+        self.sources[name] = stats_function
+
+    def collect(self):
+        hits = CounterMetricFamily("picopix_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily(
+            "picopix_cache_misses", "Cache misses", labels=["cache"]
+        )
+        hit_rate = GaugeMetricFamily(
+            "picopix_cache_hit_rate", "Cache hit rate", labels=["cache"]
+        )
+        size = GaugeMetricFamily(
+            "picopix_cache_size", "Cache entries", labels=["cache"]
+        )
+        depth = GaugeMetricFamily(
+            "picopix_queue_depth",
+            "Operations running or waiting in a queue",
+            labels=["queue"],
+        )
+        rejected = CounterMetricFamily(
+            "picopix_queue_rejected",
+            "Operations rejected by a full queue",
+            labels=["queue"],
+        )
+        for name, stats_function in self.sources.items():
+            stats = stats_function()
+            if "hits" in stats:
+                hits.add_metric([name], stats["hits"])
+                misses.add_metric([name], stats["misses"])
+                hit_rate.add_metric([name], stats["hit_rate"])
+                size.add_metric([name], stats["size"])
+            if "pending" in stats:
+                depth.add_metric([name], stats["pending"])
+                rejected.add_metric([name], stats["rejected"])
+            if "checked_out" in stats:
+                depth.add_metric([name], stats["checked_out"])
+        yield from (hits, misses, hit_rate, size, depth, rejected)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
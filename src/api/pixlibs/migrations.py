@@ -0,0 +1,84 @@
+# Project PicoPix
+# Authors : Mohamed CHELALI, Daniel LEWANDOWSKI, Yannick OREAL
+# Database schema migrations
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, text
+from sqlalchemy import insert, select
+from sqlalchemy.sql import func
+from pixlibs import models
+
+# metadata.create_all() only creates missing tables, it never alters existing
+# ones. Every schema change made after the first deployment is declared here
+# as an ordered, idempotent step and recorded in the schema_migrations table.
+migrations_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migrations_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(128)),
+    Column("applied_date", DateTime(timezone=True), server_default=func.now()),
+)
+
+# arbitrary key for postgres advisory lock (several api workers may start together)
+MIGRATIONS_LOCK_ID = 7419
+
+
+def _create_indexes(connection, table, names):
+    for index in table.indexes:
+        if index.name in names:
+            index.create(bind=connection, checkfirst=True)
+
+
+def add_latest_image_indexes(connection):
+    _create_indexes(
+        connection, models.BW_Images.__table__, {"ix_bw_images_user_id_upload_date"}
+    )
+    _create_indexes(
+        connection,
+        models.COLOR_Images.__table__,
+        {"ix_color_images_user_id_creation_date"},
+    )
+
+
+# (version, description, upgrade function)
+MIGRATIONS = [
+    (1, "composite indexes for latest image lookups", add_latest_image_indexes),
+]
+
+
+def run_migrations(engine):
+    """
+    Description
+    -----------
+    apply every migration not yet recorded in schema_migrations
+
+    Parameters
+    ----------
+    engine: sqlalchemy engine
+
+    Returns
+    -------
+    list: versions applied during this call
+    """
+    migrations_metadata.create_all(bind=engine)
+    applied_now = []
+    for version, description, upgrade in MIGRATIONS:
+        with engine.begin() as connection:
+            if connection.dialect.name == "postgresql":
+                connection.execute(
+                    text("SELECT pg_advisory_xact_lock(:lock_id)"),
+                    {"lock_id": MIGRATIONS_LOCK_ID},
+                )
+            applied = set(
+                connection.execute(select(schema_migrations.c.version)).scalars()
+            )
+            if version in applied:
+                continue
+            upgrade(connection)
+            connection.execute(
+                insert(schema_migrations).values(
+                    version=version, description=description
+                )
+            )
+            applied_now.append(version)
+    return applied_now
@@ -2,7 +2,7 @@
 # Authors : Mohamed CHELALI, Daniel LEWANDOWSKI, Yannick OREAL
 # Declarative database class
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import relationship
@@ -32,6 +32,16 @@ class BW_Images(Base):
     filename = Column(String(64), unique=True)
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
 
+    # latest image lookup (user_id = ? order by upload_date desc limit 1)
+    __table_args__ = (
+        Index(
+            "ix_bw_images_user_id_upload_date",
+            "user_id",
+            "upload_date",
+            postgresql_include=["id", "filename"],
+        ),
+    )
+
 
 class COLOR_Images(Base):
     __tablename__ = "color_images"
@@ -44,6 +54,16 @@ class COLOR_Images(Base):
     creation_date = Column(DateTime(timezone=True), server_default=func.now())
     rating = Column(Integer, index=True, default=None)
 
+    # latest image lookup (user_id = ? order by creation_date desc limit 1)
+    __table_args__ = (
+        Index(
+            "ix_color_images_user_id_creation_date",
+            "user_id",
+            "creation_date",
+            postgresql_include=["id", "filename"],
+        ),
+    )
+
 
 class MODELS(Base):
     __tablename__ = "models"
@@ -0,0 +1,99 @@
+# Project PicoPix
+# Authors : Mohamed CHELALI, Daniel LEWANDOWSKI, Yannick OREAL
+# Password hashing & verification (bcrypt) in a bounded worker pool
+
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from starlette import status
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+
+# Ignore passlib warning
+logging.getLogger("passlib").setLevel(logging.ERROR)
+
+# Load .env environment variables
+load_dotenv()
+# bcrypt cost factor (2^rounds iterations), existing hashes are upgraded at login
+AUTH_BCRYPT_ROUNDS = int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))
+# threads running bcrypt (bcrypt releases the GIL)
+AUTH_HASH_WORKERS = int(
+    os.getenv("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+# running + queued operations above which requests are rejected (503)
+AUTH_HASH_MAX_PENDING = int(os.getenv("AUTH_HASH_MAX_PENDING", "64"))
+
+# Set Crypt Context
+bcrypt_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=AUTH_BCRYPT_ROUNDS
+)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt out of the event loop, in a fixed size thread pool.
+
+    When more than max_pending operations are running or queued, new ones are
+    rejected at once with a 503 (Retry-After) instead of piling up: a login
+    storm then costs at most `workers` cores and every other endpoint keeps
+    its latency.
+    """
+
+    def __init__(
+        self,
+        context: CryptContext = bcrypt_context,
+        workers: int = AUTH_HASH_WORKERS,
+        max_pending: int = AUTH_HASH_MAX_PENDING,
+    ):
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        # only modified from the event loop thread
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def _run(self, function, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, retry later.",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, function, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        # returns (password ok, new hash if the stored one uses old parameters)
+        return await self._run(
+            self.context.verify_and_update, password, hashed_password
+        )
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "bcrypt_rounds": AUTH_BCRYPT_ROUNDS,
+        }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,119 @@
+# Project PicoPix
+# Authors : Mohamed CHELALI, Daniel LEWANDOWSKI, Yannick OREAL
+# Per-process users cache (admin checks, favorite model, ...)
+
+from collections import OrderedDict
+from dotenv import load_dotenv
+from sqlalchemy import select
+import threading
+import time
+import os
+from pixlibs import database
+from pixlibs import models
+
+# Load .env environment variables
+load_dotenv()
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
+
+class UserCache:
+    """
+    Caches users rows by id for a few seconds.
+
+    Every endpoint modifying a user must call invalidate(). Each api worker
+    process has its own cache, so changes made by another worker are seen
+    after USER_CACHE_TTL seconds at most.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, maxsize: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # incremented on every invalidation, a lookup started before an
+        # invalidation must not store its (maybe stale) result
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _snapshot(user: models.Users) -> dict:
+        return {
+            "id": user.id,
+            "username": user.username,
+            "firstname": user.firstname,
+            "lastname": user.lastname,
+            "isadmin": user.isadmin,
+            "disabled": user.disabled,
+            "pref_model": user.pref_model,
+        }
+
+    async def get(self, db, user_id: int) -> dict | None:
+        """
+        Description
+        -----------
+        get user data from cache, or from database on miss/expiry
+
+        Parameters
+        ----------
+        db: database session
+        user_id: user id
+
+        Returns
+        -------
+        dict: user data (None if user does not exist)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        user = await database.fetch_first(
+            db, select(models.Users).where(models.Users.id == user_id)
+        )
+        if user is None:
+            return None
+        data = self._snapshot(user)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[user_id] = (time.monotonic() + self.ttl, data)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return data
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        """
+        Description
+        -----------
+        drop one user (or every user if user_id is None) from cache
+        """
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "ttl": self.ttl,
+            }
+
+
+user_cache = UserCache()
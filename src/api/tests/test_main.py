@@ -334,6 +334,32 @@ def test_set_admin_access(client, test_admin):
     assert response2.json() == {"message": "Admin access is disabled for unittestuser!"}
 
 
+# diagnostics endpoint test
+def test_diagnostics(client, test_user, test_admin):
+    token = test_auth_token(client, test_user)
+    response = client.get("/diagnostics", headers={"Authorization": f"Bearer {token}"})
+    assert (
+        response.status_code == 401
+    ), f"Unexpected status code: {response.status_code}"
+    token = test_auth_token(client, test_admin)
+    response = client.get("/diagnostics", headers={"Authorization": f"Bearer {token}"})
+    assert (
+        response.status_code == 200
+    ), f"Unexpected status code: {response.status_code}"
+    assert "db_pool" in response.json(), "Response JSON does not contain 'db_pool'."
+
+
+# prometheus metrics endpoint test (after colorize)
+def test_metrics(client):
+    response = client.get("/metrics")
+    assert (
+        response.status_code == 200
+    ), f"Unexpected status code: {response.status_code}"
+    assert 'endpoint="/colorize_bw_image"' in response.text
+    assert 'stage="forward"' in response.text
+    assert 'cache="user_cache"' in response.text
+
+
 # delete_user endpoint test
 def test_delete_user(client, test_user):
     token = test_auth_token(client, test_user)
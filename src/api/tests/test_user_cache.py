@@ -0,0 +1,52 @@
+# Project PicoPix
+# Authors : Mohamed CHELALI, Daniel LEWANDOWSKI, Yannick OREAL
+# Unit Tests (users cache)
+
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from pixlibs import models
+from pixlibs.user_cache import UserCache
+
+
+# Declare in-memory database with one user
+@pytest.fixture()
+def db():
+    # lookups run in the threadpool, share one in-memory connection
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        session.add(
+            models.Users(id=1, username="cacheuser", hashed_password="x", pref_model=1)
+        )
+        session.commit()
+        yield session
+
+
+# hit / miss / invalidation test
+def test_user_cache_hit_and_invalidate(db):
+    cache = UserCache(ttl=60, maxsize=10)
+    assert asyncio.run(cache.get(db, 1))["pref_model"] == 1
+    db.get(models.Users, 1).pref_model = 2
+    db.commit()
+    # cached value until invalidation
+    assert asyncio.run(cache.get(db, 1))["pref_model"] == 1
+    cache.invalidate(1)
+    assert asyncio.run(cache.get(db, 1))["pref_model"] == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+
+# expiry + unknown user test
+def test_user_cache_ttl_and_unknown_user(db):
+    cache = UserCache(ttl=0, maxsize=10)
+    asyncio.run(cache.get(db, 1))
+    asyncio.run(cache.get(db, 1))
+    assert cache.stats()["hits"] == 0
+    assert asyncio.run(cache.get(db, 42)) is None
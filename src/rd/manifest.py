@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from PIL import Image
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+IMAGE_EXTENSIONS = (".jpg",)
+
+
+def manifest_path(root_dir: str) -> str:
+    """
+    Returns the manifest file path of a split directory.
+
+    Args:
+        root_dir (str): Split directory (e.g. dataset/coco_dataset/train).
+
+    Returns:
+        str: Path of the manifest file.
+    """
+    return os.path.join(root_dir, MANIFEST_FILE)
+
+
+def load_manifest(root_dir: str) -> Optional[Dict]:
+    """
+    Loads the manifest of a split directory.
+
+    Args:
+        root_dir (str): Split directory.
+
+    Returns:
+        Optional[Dict]: The manifest, or None if the directory has none.
+    """
+    path = manifest_path(root_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as fin:
+        manifest = json.load(fin)
+    if manifest.get("format") != MANIFEST_FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def _describe(root_dir: str, relpath: str, stat: os.stat_result) -> Dict:
+    """
+    Reads the dimensions (image header only) and hashes the content of one file.
+    """
+    path = os.path.join(root_dir, relpath)
+    with Image.open(path) as image:
+        width, height = image.size
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(1 << 20), b""):
+            sha256.update(chunk)
+    return {
+        "path": relpath,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "width": width,
+        "height": height,
+        "sha256": sha256.hexdigest(),
+        "categories": [],
+    }
+
+
+def update_manifest(
+    root_dir: str,
+    categories: Optional[Dict[str, Iterable[str]]] = None,
+    workers: int = 8,
+) -> Dict:
+    """
+    Scans a split directory and writes its manifest. Files whose size and
+    modification time did not change keep their previous entry, so only new
+    or modified images are opened and hashed.
+
+    Args:
+        root_dir (str): Split directory.
+        categories (Optional[Dict[str, Iterable[str]]]): Category names per
+            image file name (basename), e.g. from the COCO annotations.
+        workers (int): Threads reading and hashing new images.
+
+    Returns:
+        Dict: The manifest written to root_dir/manifest.json.
+    """
+    previous = load_manifest(root_dir)
+    known = {entry["path"]: entry for entry in previous["images"]} if previous else {}
+
+    files = []
+    for root, dirs, names in os.walk(root_dir):
+        dirs.sort()
+        for name in sorted(names):
+            if name.endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, name)
+                files.append((os.path.relpath(path, root_dir), os.stat(path)))
+
+    entries = [None] * len(files)
+    todo = []
+    for i, (relpath, stat) in enumerate(files):
+        entry = known.get(relpath)
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime
+        ):
+            entries[i] = entry
+        else:
+            todo.append(i)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        described = executor.map(
+            lambda i: _describe(root_dir, *files[i]), todo, chunksize=64
+        )
+        for i, entry in zip(todo, described):
+            entries[i] = entry
+
+    if categories is not None:
+        for entry in entries:
+            entry["categories"] = sorted(
+                categories.get(os.path.basename(entry["path"]), [])
+            )
+
+    manifest = {
+        "format": MANIFEST_FORMAT_VERSION,
+        "count": len(entries),
+        "images": entries,
+    }
+    # atomic replace : a reader never sees a partial manifest
+    tmp_path = manifest_path(root_dir) + ".tmp"
+    with open(tmp_path, "w") as fout:
+        json.dump(manifest, fout)
+    os.replace(tmp_path, manifest_path(root_dir))
+    print(
+        f"Manifest {manifest_path(root_dir)}: {len(entries)} images "
+        f"({len(todo)} new or modified)"
+    )
+    return manifest
+
+
+def select_images(
+    manifest: Dict,
+    categories: Optional[Iterable[str]] = None,
+    min_size: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Selects manifest entries without touching the files.
+
+    Args:
+        manifest (Dict): A manifest loaded by load_manifest.
+        categories (Optional[Iterable[str]]): Keep images containing at least
+            one of these categories.
+        min_size (Optional[int]): Keep images whose width and height are at
+            least min_size pixels.
+
+    Returns:
+        List[Dict]: The selected entries.
+    """
+    entries = manifest["images"]
+    if categories:
+        wanted = set(categories)
+        entries = [e for e in entries if wanted.intersection(e["categories"])]
+    if min_size:
+        entries = [
+            e for e in entries if e["width"] >= min_size and e["height"] >= min_size
+        ]
+    return entries
+
+
+def list_images(
+    root_dir: str,
+    categories: Optional[Iterable[str]] = None,
+    min_size: Optional[int] = None,
+) -> List[str]:
+    """
+    Lists the images of a split directory from its manifest, or by walking
+    the directory when it has no manifest yet.
+
+    Args:
+        root_dir (str): Split directory.
+        categories (Optional[Iterable[str]]): See select_images.
+        min_size (Optional[int]): See select_images.
+
+    Returns:
+        List[str]: Image paths.
+    """
+    manifest = load_manifest(root_dir)
+    if manifest is None:
+        if categories or min_size:
+            raise ValueError(
+                f"No manifest in {root_dir}: build it (scripts.build_manifest) "
+                "to select images by category or size"
+            )
+        return [
+            os.path.join(root, f)
+            for root, dirs, files in os.walk(root_dir)
+            for f in files
+            if f.endswith(IMAGE_EXTENSIONS)
+        ]
+    return [
+        os.path.join(root_dir, entry["path"])
+        for entry in select_images(manifest, categories, min_size)
+    ]
@@ -0,0 +1,82 @@
+import argparse
+import os
+import time
+
+import torch
+import torchvision.transforms as T
+from PIL import Image
+from torch.utils.data import DataLoader
+
+from utils import (
+    LABColorDataset,
+    MemmapLABDataset,
+    MemmapPix2pixDataset,
+    Pix2pixDataset,
+    TarShardDataset,
+)
+
+
+def measure(name, dataset, args, shuffle):
+    """
+    Iterates over the dataset through a DataLoader and prints images/s.
+    """
+    loader = DataLoader(
+        dataset,
+        batch_size=args.batch_size,
+        shuffle=shuffle,
+        num_workers=args.n_cpu,
+    )
+    count = 0
+    start = time.time()
+    for batch in loader:
+        count += batch[0].size(0)
+        if args.max_images and count >= args.max_images:
+            break
+    elapsed = time.time() - start
+    print(f"{name:<10} {count:7d} images {elapsed:7.1f}s {count / elapsed:9.1f} img/s")
+
+
+if __name__ == "__main__":
+    # Throughput of the loose files, tar shards and memmap datasets
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--image_dir", type=str, required=True, help="Split folder of loose images"
+    )
+    parser.add_argument(
+        "--shard_dir", type=str, default=None, help="Same split packed in tar shards"
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="Same split compiled in memmap shards (<cache_dir>/<kind>)",
+    )
+    parser.add_argument("--kind", type=str, default="lab", choices=["lab", "pix2pix"])
+    parser.add_argument("--size", type=int, default=256, help="image size")
+    parser.add_argument("--batch_size", type=int, default=16, help="batch size")
+    parser.add_argument("--n_cpu", type=int, default=4, help="DataLoader workers")
+    parser.add_argument(
+        "--max_images", type=int, default=None, help="stop after this many images"
+    )
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    transform = T.Compose([T.Resize((args.size, args.size), Image.BICUBIC), T.ToTensor()])
+    if args.kind == "lab":
+        files = LABColorDataset(args.image_dir, transform)
+    else:
+        files = Pix2pixDataset(args.image_dir, transforms=transform)
+    measure("files", files, args, shuffle=True)
+
+    if args.shard_dir:
+        shards = TarShardDataset(args.shard_dir, kind=args.kind, transform=transform)
+        measure("tar", shards, args, shuffle=False)
+
+    if args.cache_dir:
+        cache_dir = os.path.join(args.cache_dir, args.kind)
+        memmap = (
+            MemmapLABDataset(cache_dir)
+            if args.kind == "lab"
+            else MemmapPix2pixDataset(cache_dir)
+        )
+        measure("memmap", memmap, args, shuffle=True)
@@ -0,0 +1,28 @@
+import argparse
+import os
+
+from manifest import update_manifest
+
+SPLITS = ["train", "val", "test"]
+
+
+if __name__ == "__main__":
+    # Build or refresh the manifest of each split (only new files are read)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--image_dir",
+        type=str,
+        default="dataset/",
+        help="Directory containing the train, val and test image folders",
+    )
+    parser.add_argument(
+        "--n_cpu", type=int, default=8, help="number of threads hashing images"
+    )
+    args = parser.parse_args()
+
+    for split in SPLITS:
+        split_dir = os.path.join(args.image_dir, split)
+        if not os.path.isdir(split_dir):
+            print(f"Skipping {split_dir} (not found)")
+            continue
+        update_manifest(split_dir, workers=args.n_cpu)
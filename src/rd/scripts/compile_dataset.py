@@ -0,0 +1,64 @@
+import argparse
+import os
+import time
+
+from utils import compile_memmap_dataset
+
+SPLITS = ["train", "val", "test"]
+
+
+if __name__ == "__main__":
+    # Decode / convert / resize the images once into memmap shards
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--image_dir",
+        type=str,
+        default="dataset/",
+        help="Directory containing the train, val and test image folders",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default="dataset_cache/",
+        help="Directory receiving the compiled splits (<cache_dir>/<kind>/<split>)",
+    )
+    parser.add_argument(
+        "--kind",
+        type=str,
+        default="all",
+        choices=["lab", "pix2pix", "all"],
+        help="lab (autoencoder), pix2pix or all",
+    )
+    parser.add_argument(
+        "--size", type=int, default=256, help="height and width of stored images"
+    )
+    parser.add_argument(
+        "--shard_size", type=int, default=1024, help="number of images per shard"
+    )
+    parser.add_argument(
+        "--n_cpu", type=int, default=4, help="number of workers decoding images"
+    )
+    args = parser.parse_args()
+
+    kinds = ["lab", "pix2pix"] if args.kind == "all" else [args.kind]
+    for kind in kinds:
+        for split in SPLITS:
+            split_dir = os.path.join(args.image_dir, split)
+            if not os.path.isdir(split_dir):
+                print(f"Skipping {split_dir} (not found)")
+                continue
+            output_dir = os.path.join(args.cache_dir, kind, split)
+            start = time.time()
+            index = compile_memmap_dataset(
+                split_dir,
+                output_dir,
+                kind=kind,
+                size=args.size,
+                shard_size=args.shard_size,
+                num_workers=args.n_cpu,
+            )
+            print(
+                f"{kind}/{split}: {index['count']} images in "
+                f"{len(index['shards'])} shards ({time.time() - start:.1f}s) "
+                f"-> {output_dir}"
+            )
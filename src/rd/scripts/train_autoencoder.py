@@ -11,7 +11,7 @@ from PIL import Image
 from mlflow import MlflowClient
 import mlflow
 
-from utils import LABColorDataset, Trainer
+from utils import LABColorDataset, MemmapLABDataset, TarShardDataset, Trainer
 
 CLIENT = MlflowClient(tracking_uri="http://r_and_d:8002")
 # Define experiment name, run name and artifact_path name
@@ -71,6 +71,31 @@ if __name__ == "__main__":
         default=10,
         help="Stop trainning if validation does not decrease at given times",
     )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="Compiled dataset (scripts.compile_dataset) used instead of image_dir",
+    )
+    parser.add_argument(
+        "--shard_dir",
+        type=str,
+        default=None,
+        help="Tar shards (scripts.write_shards) streamed instead of image_dir",
+    )
+    parser.add_argument(
+        "--categories",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Only train on images with one of these categories (split manifest)",
+    )
+    parser.add_argument(
+        "--min_size",
+        type=int,
+        default=None,
+        help="Only train on images at least min_size pixels wide and high",
+    )
     args = parser.parse_args()
 
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -102,19 +127,40 @@ if __name__ == "__main__":
         ]
     )
     # transforms = T.Compose([T.RandomResizedCrop(224), T.RandomHorizontalFlip()])
-    train_imagefolder = LABColorDataset(f"{root_data}/train", transforms)
+
+    def make_dataset(split):
+        if args.cache_dir:
+            return MemmapLABDataset(f"{args.cache_dir}/lab/{split}")
+        if args.shard_dir:
+            return TarShardDataset(
+                f"{args.shard_dir}/{split}",
+                kind="lab",
+                transform=transforms,
+                shuffle=split == "train",
+            )
+        return LABColorDataset(
+            f"{root_data}/{split}",
+            transforms,
+            categories=args.categories,
+            min_size=args.min_size,
+        )
+
+    train_imagefolder = make_dataset("train")
     train_loader = torch.utils.data.DataLoader(
-        train_imagefolder, batch_size=args.batch_size, shuffle=True
+        train_imagefolder,
+        batch_size=args.batch_size,
+        # tar shards are shuffled by the dataset itself
+        shuffle=not args.shard_dir,
     )
 
     # Validation
-    val_imagefolder = LABColorDataset(f"{root_data}/val", transforms)
+    val_imagefolder = make_dataset("val")
     val_loader = torch.utils.data.DataLoader(
         val_imagefolder, batch_size=args.batch_size, shuffle=False
     )
 
     # Test
-    test_imagefolder = LABColorDataset(f"{root_data}/test", transforms)
+    test_imagefolder = make_dataset("test")
     test_loader = torch.utils.data.DataLoader(
         test_imagefolder, batch_size=args.batch_size, shuffle=False
     )
@@ -129,6 +175,8 @@ if __name__ == "__main__":
         # Train model
         for epoch in range(args.epochs):
             # Train for one epoch, then validate
+            if args.shard_dir:
+                train_imagefolder.set_epoch(epoch)
             trainner.train(train_loader, epoch, model, criterion, optimizer)
             scheduler.step()
             with torch.no_grad():
@@ -18,7 +18,7 @@ from PIL import Image
 from mlflow import MlflowClient
 import mlflow
 
-from utils import Pix2pixDataset
+from utils import Pix2pixDataset, MemmapPix2pixDataset, TarShardDataset
 from model.pix2pix import GeneratorUNet, Discriminator, weights_init_normal
 
 CLIENT = MlflowClient(tracking_uri="http://r_and_d:8002")
@@ -92,6 +92,31 @@ if __name__ == "__main__":
         default=10,
         help="Stop trainning if validation does not decrease at given times",
     )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="Compiled dataset (scripts.compile_dataset) used instead of image_dir",
+    )
+    parser.add_argument(
+        "--shard_dir",
+        type=str,
+        default=None,
+        help="Tar shards (scripts.write_shards) streamed instead of image_dir",
+    )
+    parser.add_argument(
+        "--categories",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Only train on images with one of these categories (split manifest)",
+    )
+    parser.add_argument(
+        "--min_size",
+        type=int,
+        default=None,
+        help="Only train on images at least min_size pixels wide and high",
+    )
     args = parser.parse_args()
 
     dataset = os.path.dirname(args.image_dir).split(os.path.sep)[-1]
@@ -155,15 +180,33 @@ if __name__ == "__main__":
         ]
     )
 
+    def make_dataset(split):
+        if args.cache_dir:
+            return MemmapPix2pixDataset(f"{args.cache_dir}/pix2pix/{split}")
+        if args.shard_dir:
+            return TarShardDataset(
+                f"{args.shard_dir}/{split}",
+                kind="pix2pix",
+                transform=transforms_,
+                shuffle=split == "train",
+            )
+        return Pix2pixDataset(
+            f"{root_data}/{split}",
+            transforms=transforms_,
+            categories=args.categories,
+            min_size=args.min_size,
+        )
+
     dataloader = DataLoader(
-        Pix2pixDataset(f"{root_data}/train", transforms=transforms_),
+        make_dataset("train"),
         batch_size=args.batch_size,
-        shuffle=True,
+        # tar shards are shuffled by the dataset itself
+        shuffle=not args.shard_dir,
         num_workers=args.n_cpu,
     )
 
     val_dataloader = DataLoader(
-        Pix2pixDataset(f"{root_data}/val", transforms=transforms_),
+        make_dataset("val"),
         batch_size=10,
         shuffle=False,
         num_workers=1,
@@ -171,7 +214,7 @@ if __name__ == "__main__":
 
     # Test
     test_dataloader = DataLoader(
-        Pix2pixDataset(f"{root_data}/test", transforms=transforms_),
+        make_dataset("test"),
         batch_size=args.batch_size,
         shuffle=False,
         num_workers=1,
@@ -205,6 +248,8 @@ if __name__ == "__main__":
     prev_time = time.time()
     with mlflow.start_run(run_name=run_name) as run:
         for epoch in range(args.epoch, args.n_epochs):
+            if args.shard_dir:
+                dataloader.dataset.set_epoch(epoch)
             avg_loss_G = 0
             avg_loss_D = 0
             for i, (A, B) in enumerate(dataloader):
@@ -0,0 +1,60 @@
+import argparse
+import os
+import time
+
+from utils import write_tar_shards
+
+SPLITS = ["train", "val", "test"]
+
+
+if __name__ == "__main__":
+    # Pack each split into large tar shards for sequential streaming
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--image_dir",
+        type=str,
+        default="dataset/",
+        help="Directory containing the train, val and test image folders",
+    )
+    parser.add_argument(
+        "--shard_dir",
+        type=str,
+        default="dataset_shards/",
+        help="Directory receiving the shards of each split (<shard_dir>/<split>)",
+    )
+    parser.add_argument(
+        "--shard_size", type=int, default=1000, help="number of images per shard"
+    )
+    parser.add_argument(
+        "--categories",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Only pack images with one of these categories (split manifest)",
+    )
+    parser.add_argument(
+        "--min_size",
+        type=int,
+        default=None,
+        help="Only pack images at least min_size pixels wide and high",
+    )
+    args = parser.parse_args()
+
+    for split in SPLITS:
+        split_dir = os.path.join(args.image_dir, split)
+        if not os.path.isdir(split_dir):
+            print(f"Skipping {split_dir} (not found)")
+            continue
+        output_dir = os.path.join(args.shard_dir, split)
+        start = time.time()
+        index = write_tar_shards(
+            split_dir,
+            output_dir,
+            shard_size=args.shard_size,
+            categories=args.categories,
+            min_size=args.min_size,
+        )
+        print(
+            f"{split}: {index['count']} images in {len(index['shards'])} shards "
+            f"({time.time() - start:.1f}s) -> {output_dir}"
+        )
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+from PIL import Image
+
+from manifest import list_images, load_manifest, update_manifest
+from utils import LABColorDataset
+
+
+@pytest.fixture
+def split_dir(tmp_path):
+    # Create mock split with images of different sizes
+    img_dir = tmp_path / "train"
+    (img_dir / "sub").mkdir(parents=True)
+    Image.new("RGB", (64, 48), color=(10, 20, 30)).save(img_dir / "a.jpg")
+    Image.new("RGB", (32, 32), color=(40, 50, 60)).save(img_dir / "sub" / "b.jpg")
+    return img_dir
+
+
+def test_manifest_build_and_select(split_dir):
+    manifest = update_manifest(
+        str(split_dir), categories={"a.jpg": ["dog"], "b.jpg": ["cat", "person"]}
+    )
+    assert manifest["count"] == 2, "Manifest count mismatch"
+    entry = load_manifest(str(split_dir))["images"][0]
+    assert (entry["path"], entry["width"], entry["height"]) == ("a.jpg", 64, 48)
+    assert len(entry["sha256"]) == 64, "Missing image hash"
+
+    assert list_images(str(split_dir), categories=["cat"]) == [
+        os.path.join(str(split_dir), "sub", "b.jpg")
+    ]
+    assert list_images(str(split_dir), min_size=40) == [
+        os.path.join(str(split_dir), "a.jpg")
+    ]
+    dataset = LABColorDataset(root_dir=str(split_dir), categories=["dog", "cat"])
+    assert len(dataset) == 2, "Dataset length mismatch"
+
+
+def test_manifest_incremental_update(split_dir):
+    first = update_manifest(str(split_dir), categories={"a.jpg": ["dog"]})
+    Image.new("RGB", (16, 16)).save(split_dir / "c.jpg")
+    os.remove(split_dir / "sub" / "b.jpg")
+    second = update_manifest(str(split_dir))
+    assert [e["path"] for e in second["images"]] == ["a.jpg", "c.jpg"]
+    # unchanged file keeps its entry (and its categories)
+    assert second["images"][0] == first["images"][0]
+
+
+def test_list_images_without_manifest(split_dir):
+    assert len(list_images(str(split_dir))) == 2, "Directory walk mismatch"
+    with pytest.raises(ValueError):
+        list_images(str(split_dir), categories=["dog"])
@@ -55,6 +55,71 @@ def test_lab_color_dataset_item(mock_dataset):
     assert img_gray.shape[1:] == img_ab.shape[1:], "Image dimensions mismatch"
 
 
+def test_memmap_lab_dataset(mock_dataset, tmp_path):
+    index = compile_memmap_dataset(
+        str(mock_dataset), str(tmp_path / "lab"), kind="lab", size=32, shard_size=2
+    )
+    assert [shard["count"] for shard in index["shards"]] == [2, 1]
+    transform = transforms.Compose(
+        [transforms.Resize((32, 32), Image.BICUBIC), transforms.ToTensor()]
+    )
+    dataset = LABColorDataset(root_dir=str(mock_dataset), transform=transform)
+    compiled = MemmapLABDataset(str(tmp_path / "lab"))
+    assert len(compiled) == 3, "Compiled dataset length mismatch"
+    for i in range(3):
+        for expected, value in zip(dataset[i], compiled[i]):
+            assert value.dtype == torch.float32
+            assert torch.allclose(expected, value, rtol=1e-3, atol=1e-3), "LAB values mismatch"
+
+
+def test_memmap_pix2pix_dataset(mock_dataset, tmp_path):
+    compile_memmap_dataset(
+        str(mock_dataset), str(tmp_path / "p2p"), kind="pix2pix", size=32
+    )
+    transform = transforms.Compose(
+        [transforms.Resize((32, 32), Image.BICUBIC), transforms.ToTensor()]
+    )
+    dataset = Pix2pixDataset(root_dir=str(mock_dataset), transforms=transform)
+    compiled = MemmapPix2pixDataset(str(tmp_path / "p2p"))
+    for i in range(3):
+        for expected, value in zip(dataset[i], compiled[i]):
+            assert torch.equal(expected, value), "Pix2pix values mismatch"
+    with pytest.raises(ValueError):
+        MemmapLABDataset(str(tmp_path / "p2p"))
+
+
+def test_tar_shard_dataset(mock_dataset, tmp_path):
+    index = write_tar_shards(str(mock_dataset), str(tmp_path / "shards"), shard_size=2)
+    assert [shard["count"] for shard in index["shards"]] == [2, 1]
+    transform = transforms.Compose(
+        [transforms.Resize((32, 32), Image.BICUBIC), transforms.ToTensor()]
+    )
+    expected = sorted(
+        img_A.sum().item()
+        for _, img_A in Pix2pixDataset(root_dir=str(mock_dataset), transforms=transform)
+    )
+    # every sample exactly once, whatever the shuffling and workers split
+    dataset = TarShardDataset(
+        str(tmp_path / "shards"), kind="pix2pix", transform=transform, buffer_size=2
+    )
+    loader = torch.utils.data.DataLoader(dataset, batch_size=1, num_workers=2)
+    assert sorted(img_A.sum().item() for _, img_A in loader) == expected
+    # ranks read disjoint shards
+    sums = []
+    for rank in range(2):
+        dataset = TarShardDataset(
+            str(tmp_path / "shards"),
+            kind="pix2pix",
+            transform=transform,
+            rank=rank,
+            world_size=2,
+        )
+        samples = list(dataset)
+        assert len(samples) == len(dataset), "Rank length mismatch"
+        sums += [img_A.sum().item() for _, img_A in samples]
+    assert sorted(sums) == expected
+
+
 def test_average_meter():
     meter = AverageMeter()
     meter.update(10, 2)
@@ -1,8 +1,11 @@
+import io
 import json
 import os
+import random
+import tarfile
 import time
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, IterableDataset
 import numpy as np
 from skimage.color import rgb2lab, rgb2gray, lab2rgb
 from torchvision import datasets
@@ -10,56 +13,112 @@ import matplotlib.pyplot as plt
 from typing import Dict, Optional
 from PIL import Image
 
+from manifest import list_images
+
+
+def pix2pix_sample(image: Image.Image, transform=None):
+    """
+    Builds a Pix2pixDataset sample from an RGB image.
+
+    Args:
+        image (Image.Image): RGB image.
+        transform: Optional torchvision transform (must end with ToTensor).
+
+    Returns:
+        Tuple[torch.Tensor, torch.Tensor]: Grayscale (3 channels) and RGB images.
+    """
+    # Convert image to NumPy array
+    img_A = np.asarray(image)
+
+    # Get grayscale version as img_B
+    img_B = rgb2gray(img_A)
+
+    # Convert grayscale image back to 3 channels by stacking
+    img_B = np.stack([img_B] * 3, axis=-1)  # Shape (H, W, 3)
+
+    # Apply transforms if available
+    if transform:
+        # Apply transforms and normalize to [-1, 1]
+        img_A = transform(Image.fromarray(img_A)) * 2 - 1
+        img_B = (
+            transform(Image.fromarray((img_B * 255).astype(np.uint8))) * 2 - 1
+        )  # Rescale grayscale to 0-255, then normalize
+
+    return img_B, img_A
+
+
+def lab_sample(image: Image.Image, transform=None):
+    """
+    Builds a LABColorDataset sample from an RGB image.
+
+    Args:
+        image (Image.Image): RGB image.
+        transform: Optional torchvision transform (must end with ToTensor).
+
+    Returns:
+        Tuple[torch.Tensor, torch.Tensor]: Grayscale image tensor and "ab" channel tensor.
+    """
+    if transform:
+        image = transform(image)  # Apply transforms if provided
+
+    # Convertir le tensor RGB en numpy pour LAB conversion
+    image_np = image.permute(1, 2, 0).numpy()  # (H, W, C) pour skimage
+    image_np = image_np * 255.0  # Remettre l'image dans la plage [0, 255]
+
+    # Conversion en LAB
+    img_lab = rgb2lab(image_np).astype(np.float32)
+
+    # Normaliser chaque canal
+    L = img_lab[:, :, 0] / 100.0  # Normalise L dans [0, 1]
+    a = (img_lab[:, :, 1] + 128) / 255.0  # Normalise a dans [0, 1]
+    b = (img_lab[:, :, 2] + 128) / 255.0  # Normalise b dans [0, 1]
+
+    # Combine en tensors PyTorch
+    input_L = torch.tensor(L).unsqueeze(0)  # Ajoute une dimension pour le canal (1, H, W)
+    target_ab = torch.tensor(np.stack((a, b), axis=-1)).permute(2, 0, 1)  # (2, H, W)
+
+    return input_L, target_ab
+
 
 class Pix2pixDataset(Dataset):
 
-    def __init__(self, root_dir, transforms=None, mode="train"):
+    def __init__(
+        self, root_dir, transforms=None, mode="train", categories=None, min_size=None
+    ):
         self.transform = transforms
 
-        self.image_paths = [
-            os.path.join(root, f)
-            for root, dirs, files in os.walk(root_dir)
-            for f in files
-            if f.endswith(".jpg")
-        ]
+        # read from root_dir/manifest.json when available (no directory walk)
+        self.image_paths = list_images(root_dir, categories, min_size)
 
     def __getitem__(self, index):
         # Load and convert image to RGB
         image = Image.open(self.image_paths[index % len(self.image_paths)]).convert(
             "RGB"
         )
-
-        # Convert image to NumPy array
-        img_A = np.asarray(image)
-
-        # Get grayscale version as img_B
-        img_B = rgb2gray(img_A)
-
-        # Convert grayscale image back to 3 channels by stacking
-        img_B = np.stack([img_B] * 3, axis=-1)  # Shape (H, W, 3)
-
-        # Apply transforms if available
-        if self.transform:
-            # Apply transforms and normalize to [-1, 1]
-            img_A = self.transform(Image.fromarray(img_A)) * 2 - 1
-            img_B = self.transform(
-                Image.fromarray((img_B * 255).astype(np.uint8))
-            )  * 2 - 1 # Rescale grayscale to 0-255, then normalize
-
-        return img_B, img_A
+        return pix2pix_sample(image, self.transform)
 
     def __len__(self):
         return len(self.image_paths)
 
 
 class LABColorDataset(Dataset):
-    def __init__(self, root_dir: str, transform=None):
+    def __init__(
+        self,
+        root_dir: str,
+        transform=None,
+        categories: Optional[list] = None,
+        min_size: Optional[int] = None,
+    ):
         """
         Initialize the LABColorDataset dataset.
 
         Args:
             root_dir (str): Directory containing images.
             transform: Optional torchvision transform to apply to each image.
+            categories (Optional[list]): Only images with one of these
+                categories (requires a manifest).
+            min_size (Optional[int]): Only images with width and height of at
+                least min_size pixels (requires a manifest).
         """
         self.root_dir = root_dir
         self.transform = transform
@@ -68,12 +127,8 @@ class LABColorDataset(Dataset):
         #     for f in os.listdir(self.root_dir)
         #     if f.endswith((".png", ".jpg", ".jpeg"))
         # ]
-        self.image_paths = [
-            os.path.join(root, f)
-            for root, dirs, files in os.walk(self.root_dir)
-            for f in files
-            if f.endswith(".jpg")
-        ]
+        # read from root_dir/manifest.json when available (no directory walk)
+        self.image_paths = list_images(self.root_dir, categories, min_size)
 
     def __len__(self) -> int:
         """Returns the total number of images."""
@@ -91,29 +146,373 @@ class LABColorDataset(Dataset):
         """
         path = self.image_paths[index]  # Get the image path
         image = Image.open(path).convert("RGB")  # Load the image and ensure it's RGB
+        return lab_sample(image, self.transform)
+
+
+# Compiled (memory-mapped) datasets
+MEMMAP_INDEX_FILE = "index.json"
+MEMMAP_FORMAT_VERSION = 1
+
+# arrays stored per dataset kind: name -> (dtype, channels)
+MEMMAP_ARRAYS = {
+    # LABColorDataset outputs, float16 keeps ~3 significant digits
+    "lab": {"input_L": ("float16", 1), "target_ab": ("float16", 2)},
+    # Pix2pixDataset images before normalization, exact in uint8
+    "pix2pix": {"gray": ("uint8", 1), "rgb": ("uint8", 3)},
+}
+
+
+def compile_memmap_dataset(
+    root_dir: str,
+    output_dir: str,
+    kind: str = "lab",
+    size: int = 256,
+    shard_size: int = 1024,
+    num_workers: int = 0,
+) -> dict:
+    """
+    Decodes, converts and resizes every image of root_dir once and writes the
+    results into fixed-shape memmap shards (.npy) with an index file.
+
+    The samples are produced by LABColorDataset / Pix2pixDataset themselves
+    (Resize + ToTensor), so a compiled dataset returns the same tensors as
+    the images folder (float16 rounding for lab).
+
+    Args:
+        root_dir (str): Directory containing images.
+        output_dir (str): Directory receiving the shards and index.json.
+        kind (str): "lab" (autoencoder) or "pix2pix".
+        size (int): Height and width of the stored images.
+        shard_size (int): Number of images per shard file.
+        num_workers (int): DataLoader workers used to decode the images.
+
+    Returns:
+        dict: The index written to output_dir/index.json.
+    """
+    import torchvision.transforms as T
+
+    transform = T.Compose([T.Resize((size, size), Image.BICUBIC), T.ToTensor()])
+    if kind == "lab":
+        dataset = LABColorDataset(root_dir, transform)
+    elif kind == "pix2pix":
+        dataset = Pix2pixDataset(root_dir, transforms=transform)
+    else:
+        raise ValueError(f"Unknown dataset kind: {kind}")
+    arrays = MEMMAP_ARRAYS[kind]
+
+    os.makedirs(output_dir, exist_ok=True)
+    count = len(dataset)
+    loader = torch.utils.data.DataLoader(
+        dataset, batch_size=64, shuffle=False, num_workers=num_workers
+    )
+    batches = iter(loader)
+    pending = None  # samples decoded but not yet written
+    shards = []
+
+    for shard_id, start in enumerate(range(0, count, shard_size)):
+        shard_count = min(shard_size, count - start)
+        files = {name: f"shard_{shard_id:05d}.{name}.npy" for name in arrays}
+        outputs = {
+            name: np.lib.format.open_memmap(
+                os.path.join(output_dir, files[name]),
+                mode="w+",
+                dtype=dtype,
+                shape=(shard_count, channels, size, size),
+            )
+            for name, (dtype, channels) in arrays.items()
+        }
+        written = 0
+        while written < shard_count:
+            if pending is None:
+                pending = _memmap_samples(kind, next(batches))
+            n = min(shard_count - written, len(pending[0]))
+            for (name, output), values in zip(outputs.items(), pending):
+                output[written : written + n] = values[:n]
+            pending = tuple(values[n:] for values in pending)
+            if len(pending[0]) == 0:
+                pending = None
+            written += n
+        for output in outputs.values():
+            output.flush()
+        shards.append({"count": shard_count, "files": files})
+
+    index = {
+        "format": MEMMAP_FORMAT_VERSION,
+        "kind": kind,
+        "size": size,
+        "count": count,
+        "shard_size": shard_size,
+        "arrays": {
+            name: {"dtype": dtype, "shape": [channels, size, size]}
+            for name, (dtype, channels) in arrays.items()
+        },
+        "shards": shards,
+        "sources": [os.path.relpath(path, root_dir) for path in dataset.image_paths],
+    }
+    # the index is written last : an interrupted compilation is never used
+    tmp_path = os.path.join(output_dir, MEMMAP_INDEX_FILE + ".tmp")
+    with open(tmp_path, "w") as fout:
+        json.dump(index, fout, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, MEMMAP_INDEX_FILE))
+    return index
+
+
+def _memmap_samples(kind: str, batch) -> tuple:
+    """
+    Converts a batch of dataset outputs to the stored arrays (same order as
+    MEMMAP_ARRAYS[kind]).
+    """
+    if kind == "lab":
+        input_L, target_ab = batch
+        return input_L.numpy().astype(np.float16), target_ab.numpy().astype(np.float16)
+    # Pix2pixDataset returns images in [-1, 1] made from uint8 values
+    img_B, img_A = batch
+    gray = ((img_B[:, :1] + 1) * 127.5).round().to(torch.uint8).numpy()
+    rgb = ((img_A + 1) * 127.5).round().to(torch.uint8).numpy()
+    return gray, rgb
 
-        if self.transform:
-            image = self.transform(image)  # Apply transforms if provided
 
-        # Convertir le tensor RGB en numpy pour LAB conversion
-        image_np = image.permute(1, 2, 0).numpy()  # (H, W, C) pour skimage
-        image_np = image_np * 255.0  # Remettre l'image dans la plage [0, 255]
+class MemmapDataset(Dataset):
+    """
+    Reads a dataset compiled by compile_memmap_dataset.
 
-        # Conversion en LAB
-        img_lab = rgb2lab(image_np).astype(np.float32)
+    Shards are opened lazily as read-only memmaps in each DataLoader worker:
+    samples are read from the page cache, with no decoding nor color
+    conversion.
+    """
 
-        # Normaliser chaque canal
-        L = img_lab[:, :, 0] / 100.0  # Normalise L dans [0, 1]
-        a = (img_lab[:, :, 1] + 128) / 255.0  # Normalise a dans [0, 1]
-        b = (img_lab[:, :, 2] + 128) / 255.0  # Normalise b dans [0, 1]
+    kind = None
 
-        # Combine en tensors PyTorch
-        input_L = torch.tensor(L).unsqueeze(0)  # Ajoute une dimension pour le canal (1, H, W)
-        target_ab = torch.tensor(np.stack((a, b), axis=-1)).permute(2, 0, 1)  # (2, H, W)
+    def __init__(self, cache_dir: str):
+        """
+        Args:
+            cache_dir (str): Directory containing index.json and the shards.
+        """
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, MEMMAP_INDEX_FILE)) as fin:
+            self.index = json.load(fin)
+        if self.index["format"] != MEMMAP_FORMAT_VERSION:
+            raise ValueError(f"Unsupported dataset format: {self.index['format']}")
+        if self.index["kind"] != self.kind:
+            raise ValueError(
+                f"{cache_dir} contains a {self.index['kind']} dataset, not {self.kind}"
+            )
+        self.shard_size = self.index["shard_size"]
+        self._shards = None
+
+    def __getstate__(self):
+        # memmaps are not sent to the workers (they would be copied)
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+    def _open(self) -> None:
+        self._shards = [
+            {
+                name: np.load(os.path.join(self.cache_dir, path), mmap_mode="r")
+                for name, path in shard["files"].items()
+            }
+            for shard in self.index["shards"]
+        ]
+
+    def _arrays(self, index: int) -> dict:
+        if self._shards is None:
+            self._open()
+        if index < 0:
+            index += len(self)
+        shard = self._shards[index // self.shard_size]
+        position = index % self.shard_size
+        return {name: array[position] for name, array in shard.items()}
+
+    def __len__(self) -> int:
+        return self.index["count"]
 
+
+class MemmapLABDataset(MemmapDataset):
+    """Compiled LABColorDataset: returns (input_L, target_ab) as float32."""
+
+    kind = "lab"
+
+    def __getitem__(self, index: int):
+        arrays = self._arrays(index)
+        input_L = torch.from_numpy(arrays["input_L"].astype(np.float32))
+        target_ab = torch.from_numpy(arrays["target_ab"].astype(np.float32))
         return input_L, target_ab
 
 
+class MemmapPix2pixDataset(MemmapDataset):
+    """Compiled Pix2pixDataset: returns (img_B, img_A) in [-1, 1]."""
+
+    kind = "pix2pix"
+
+    def __getitem__(self, index: int):
+        arrays = self._arrays(index)
+        gray = torch.from_numpy(arrays["gray"].astype(np.float32))
+        rgb = torch.from_numpy(arrays["rgb"].astype(np.float32))
+        img_B = (gray / 255.0 * 2 - 1).expand(3, -1, -1)
+        img_A = rgb / 255.0 * 2 - 1
+        return img_B, img_A
+
+
+# Tar shards (WebDataset-style) streaming datasets
+TAR_INDEX_FILE = "shards.json"
+
+
+def write_tar_shards(
+    root_dir: str,
+    output_dir: str,
+    shard_size: int = 1000,
+    categories: Optional[list] = None,
+    min_size: Optional[int] = None,
+    seed: int = 0,
+) -> dict:
+    """
+    Packs the images of root_dir into large tar shards (original JPEG bytes,
+    no re-encoding) read sequentially by TarShardDataset.
+
+    Images are shuffled once before packing so each shard is a random sample
+    of the split.
+
+    Args:
+        root_dir (str): Directory containing images (manifest used if present).
+        output_dir (str): Directory receiving the shards and shards.json.
+        shard_size (int): Number of images per shard.
+        categories (Optional[list]): See LABColorDataset.
+        min_size (Optional[int]): See LABColorDataset.
+        seed (int): Seed of the packing order.
+
+    Returns:
+        dict: The index written to output_dir/shards.json.
+    """
+    paths = list_images(root_dir, categories, min_size)
+    random.Random(seed).shuffle(paths)
+    os.makedirs(output_dir, exist_ok=True)
+
+    shards = []
+    for shard_id, start in enumerate(range(0, len(paths), shard_size)):
+        name = f"shard-{shard_id:05d}.tar"
+        tmp_path = os.path.join(output_dir, name + ".tmp")
+        members = paths[start : start + shard_size]
+        with tarfile.open(tmp_path, "w") as tar:
+            for i, path in enumerate(members):
+                # member name : sample key + extension
+                tar.add(path, arcname=f"{start + i:09d}{os.path.splitext(path)[1]}")
+        os.replace(tmp_path, os.path.join(output_dir, name))
+        shards.append({"file": name, "count": len(members)})
+
+    index = {"count": len(paths), "shards": shards}
+    with open(os.path.join(output_dir, TAR_INDEX_FILE), "w") as fout:
+        json.dump(index, fout, indent=2)
+    return index
+
+
+class TarShardDataset(IterableDataset):
+    """
+    Streams samples from tar shards written by write_tar_shards.
+
+    Each shard is read sequentially (one large read instead of one open per
+    image). Shards are shuffled every epoch, then split across distributed
+    ranks and DataLoader workers, and samples are shuffled again in a buffer.
+    Samples are the same as Pix2pixDataset ("pix2pix") or LABColorDataset
+    ("lab") with the same transform.
+    """
+
+    def __init__(
+        self,
+        shard_dir: str,
+        kind: str = "lab",
+        transform=None,
+        shuffle: bool = True,
+        buffer_size: int = 1000,
+        seed: int = 0,
+        rank: Optional[int] = None,
+        world_size: Optional[int] = None,
+    ):
+        """
+        Args:
+            shard_dir (str): Directory containing shards.json and the shards.
+            kind (str): "lab" (autoencoder) or "pix2pix".
+            transform: Optional torchvision transform to apply to each image.
+            shuffle (bool): Shuffle shards and samples (training).
+            buffer_size (int): Samples kept in the shuffle buffer.
+            seed (int): Base seed, combined with the epoch (see set_epoch).
+            rank (Optional[int]): Distributed rank (default: torch.distributed).
+            world_size (Optional[int]): Number of ranks (default: torch.distributed).
+        """
+        if kind not in ("lab", "pix2pix"):
+            raise ValueError(f"Unknown dataset kind: {kind}")
+        self.shard_dir = shard_dir
+        self.sample = lab_sample if kind == "lab" else pix2pix_sample
+        self.transform = transform
+        self.shuffle = shuffle
+        self.buffer_size = buffer_size
+        self.seed = seed
+        self.epoch = 0
+        with open(os.path.join(shard_dir, TAR_INDEX_FILE)) as fin:
+            self.index = json.load(fin)
+        if rank is None or world_size is None:
+            distributed = (
+                torch.distributed.is_available() and torch.distributed.is_initialized()
+            )
+            rank = torch.distributed.get_rank() if distributed else 0
+            world_size = torch.distributed.get_world_size() if distributed else 1
+        self.rank = rank
+        self.world_size = world_size
+
+    def set_epoch(self, epoch: int) -> None:
+        """
+        Changes the shuffling order (call before each epoch, on every rank).
+        """
+        self.epoch = epoch
+
+    def _rank_shards(self) -> list:
+        shards = list(self.index["shards"])
+        if self.shuffle:
+            # same permutation on every rank
+            random.Random(self.seed + self.epoch).shuffle(shards)
+        return shards[self.rank :: self.world_size]
+
+    def __len__(self) -> int:
+        """Number of samples read by this rank during the current epoch."""
+        return sum(shard["count"] for shard in self._rank_shards())
+
+    def _read_shard(self, shard: dict):
+        path = os.path.join(self.shard_dir, shard["file"])
+        # "r|" : sequential stream, no seek
+        with tarfile.open(path, "r|") as tar:
+            for member in tar:
+                if member.isfile():
+                    data = tar.extractfile(member).read()
+                    image = Image.open(io.BytesIO(data)).convert("RGB")
+                    yield self.sample(image, self.transform)
+
+    def __iter__(self):
+        shards = self._rank_shards()
+        worker = torch.utils.data.get_worker_info()
+        if worker is not None:
+            shards = shards[worker.id :: worker.num_workers]
+        rng = random.Random(
+            (self.seed + self.epoch) * 1000003
+            + self.rank * 1009
+            + (worker.id if worker else 0)
+        )
+
+        samples = (sample for shard in shards for sample in self._read_shard(shard))
+        if not self.shuffle:
+            yield from samples
+            return
+        buffer = []
+        for sample in samples:
+            if len(buffer) < self.buffer_size:
+                buffer.append(sample)
+                continue
+            i = rng.randrange(len(buffer))
+            yield buffer[i]
+            buffer[i] = sample
+        rng.shuffle(buffer)
+        yield from buffer
+
+
 class AverageMeter:
     """
     Tracks and computes average, sum, and count of values over time.